@@ -5,14 +5,16 @@ import pyglet
 # create the main window
 window = pyglet.window.Window()
 
-# create a "Hello, world" label in the middle of the screen
+# create a "Hello, world" label in the middle of the screen; the label never
+# changes, so rather than asking the layout to re-apply 'center' anchors, keep
+# the default (cheapest) left/bottom anchors and center the label ourselves
+# from its measured content size
 label = pyglet.text.Label(  'Hello, world',
                             font_name = 'Times New Roman',
-                            font_size = 36,
-                            x = window.width / 2,
-                            anchor_x = 'center',
-                            y = window.height / 2,
-                            anchor_y = 'center' )
+                            font_size = 36  )
+
+label.x = (window.width - label.content_width) // 2
+label.y = (window.height - label.content_height) // 2
 
 # attach an 'on_draw' function to the window to define what to do
 # when window refreshes
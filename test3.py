@@ -1,8 +1,36 @@
 import pyglet
-from math import sin, cos, radians
+import numpy as np
 
 # PURPOSE: draw circles and rectangles on the screen
 
+# cache of unit-circle vertex tables, keyed by the number of vertices used to
+# draw the circle; the same few vertex counts tend to get reused, so the trig
+# for a given count only ever needs to be evaluated once
+unit_circle_cache = {}
+
+# get the interleaved [x1, y1, x2, y2, ...] coordinates of a circle of radius
+# 1 about the origin (the first vertex is repeated at the end to close the
+# circle)
+#
+# @param num_points :   number of vertices used to draw the circle
+#
+def getUnitCircle(num_points):
+    unit = unit_circle_cache.get(num_points)
+
+    if unit is None:
+        # generate the angle of every vertex up front and let numpy evaluate
+        # all of the sines and cosines in a single C-level pass (the vertices
+        # are evenly spaced)
+        theta = np.arange(num_points + 1) * (2.0 * np.pi / num_points)
+
+        unit = np.empty(2 * (num_points + 1), dtype=np.float32)
+        unit[0::2] = np.sin(theta)
+        unit[1::2] = np.cos(theta)
+
+        unit_circle_cache[num_points] = unit
+
+    return unit
+
 # generate the vertex list needed to draw a circle
 #
 # @param center_x   :   x-coordinate of center of circle
@@ -13,51 +41,40 @@ from math import sin, cos, radians
 #                       computationally expensive)
 # @param color      :   3-tuple of the RGB value to color the circle with
 #                       (optional)
+# @param batch      :   batch to add vertex list to (optional)
 #
-def generateCircle(center_x, center_y, radius, num_points, color=(255, 255, 255)):
-    # initialize the list of vertex coordinates with the top of the circle
-    vertices = [ center_x, center_y + radius ]
-
-    # set the angle to rotate vertices on the circle by (vertices are evenly spaced)
-    angle = radians(360.0 / num_points)
-
-    # instead of calculating the sine and cosines needed to find all vertices on
-    # the circle (x = r * cos(angle) and y = r * sin(angle)), we can just
-    # calculate the sine and cosine for the set angle and then multiply
-    # the starting vertex by the Cartesian rotation matrix. Each matrix
-    # multiplication will rotate us along the circle by 'angle' radians, so
-    # can just mutliply the current vertex we're on by the matrix
-    # 'num_points' times to draw the circle
-    #
-    # the relevant matrix is:   [   cos(angle), -sin(angle)   ]
-    #                           [   sin(angle), cos(angle)    ]
-
-    # doing this only once is way faster than doing it 'num_points' times
-    cosine = cos(angle)
-    sine = sin(angle)
-
-    # we need to start the vertex generating process about the origin to perform
-    # the rotation properly (rotation/translation is not communitative)
-    current_x, current_y = 0, radius
-
-    # calculate the vertices used to draw the circle (the first vertex is
-    # repeated at the end to close the circle)
-    for i in range(num_points):
-        # get the x and y coordinates of the next vertex (which will be the
-        # current vertex rotated 'angle' radians around the circle,
-        # counter-clockwise)
-        new_x = current_x * cosine - current_y * sine
-        new_y = current_x * sine + current_y * cosine
-
-        # translate the calculated coordinates so that the circle is
-        # centered about ('center_x', 'center_y')
-        vertices += [ new_x + center_x, new_y + center_y]
-
-        # update the current vertex coordinates
-        current_x, current_y = new_x, new_y
-
-    return  pyglet.graphics.vertex_list(num_points + 1,  ('v2f', vertices),
-            ('c3B', tuple([ color[i % 3] for i in range(3 * (num_points + 1)) ])))
+def generateCircle(center_x, center_y, radius, num_points, color=(255, 255, 255), batch=None):
+    # scale and translate a cached unit circle with the requested number of
+    # vertices; repeated calls with the same 'num_points' skip the trig
+    # entirely and only pay for two multiplies and two adds per coordinate
+    vertices = getUnitCircle(num_points) * radius
+    vertices[0::2] += center_x
+    vertices[1::2] += center_y
+
+    # draw the outline as indexed GL_LINES (one explicit pair of indices per
+    # edge) rather than as a GL_LINE_STRIP; unlike line strips, GL_LINES
+    # primitives concatenate cleanly, so many outlines can share one batch
+    # without the last vertex of one shape connecting to the first vertex of
+    # the next
+    indices = [ 0 ] * (2 * num_points)
+    indices[0::2] = range(num_points)
+    indices[1::2] = range(1, num_points + 1)
+
+    # repeating the color bytes N times gives the same flat color sequence as
+    # cycling through the channels by hand, but in a single C-level operation;
+    # handing pyglet the float32 coordinate array and the raw color bytes
+    # (rather than .tolist() copies) lets it fill the GL buffers without
+    # boxing and unboxing a Python object per value
+    colors = bytes(color) * (num_points + 1)
+
+    # if no batch is specified, just return the vertex list (needs to be drawn
+    # in GL_LINES mode); otherwise add the circle to the batch
+    if batch is None:
+        return  pyglet.graphics.vertex_list_indexed(num_points + 1, indices,
+                ('v2f', vertices), ('c3B', colors))
+    else:
+        return  batch.add_indexed(num_points + 1, pyglet.gl.GL_LINES, None, indices,
+                ('v2f', vertices), ('c3B', colors))
 
 # generate the vertex list needed to draw a rectangle
 #
@@ -67,37 +84,45 @@ def generateCircle(center_x, center_y, radius, num_points, color=(255, 255, 255)
 # @param width      :   width of rectangle
 # @param color      :   3-tuple of the RGB value to color the rectangle
 #                       (optional)
+# @param batch      :   batch to add vertex list to (optional)
 #
-def generateRectangle(origin_x, origin_y, width, height, color=(255, 255, 255)):
-    # note that since pyglet doesn't support GL_LINE_LOOP, you need to
-    # repeat the first vertex at the end to close the shape
-    return pyglet.graphics.vertex_list(5, ('v2f', (
-        origin_x, origin_y,
-        origin_x + width, origin_y,
-        origin_x + width, origin_y + height,
-        origin_x, origin_y + height,
-        origin_x, origin_y
-    )),
-        ('c3B', tuple([ color[i % 3] for i in range(3 * 5) ])
-    ))
+def generateRectangle(origin_x, origin_y, width, height, color=(255, 255, 255), batch=None):
+    # pyglet doesn't support GL_LINE_LOOP, but indexed GL_LINES close the
+    # shape just as well (each pair of indices is one edge) and batch cleanly
+    # with other outlines, using only the 4 unique corner vertices
+    vertices = (    origin_x, origin_y,
+                    origin_x + width, origin_y,
+                    origin_x + width, origin_y + height,
+                    origin_x, origin_y + height     )
+    indices = [ 0, 1, 1, 2, 2, 3, 3, 0 ]
+
+    # if no batch is specified, just return the vertex list (needs to be drawn
+    # in GL_LINES mode); otherwise add the rectangle to the batch
+    if batch is None:
+        return  pyglet.graphics.vertex_list_indexed(4, indices,
+                ('v2f', vertices), ('c3B', color * 4))
+    else:
+        return  batch.add_indexed(4, pyglet.gl.GL_LINES, None, indices,
+                ('v2f', vertices), ('c3B', color * 4))
 
 # create a 960 x 540 window (16:9 ratio)
 window = pyglet.window.Window(960, 540)
 
+# batch holding all of the drawn objects; since every outline is made of
+# indexed GL_LINES now (instead of GL_LINE_STRIPs, which used to connect the
+# last vertex of one object to the first vertex of the next), all the shapes
+# can share one batch and be drawn with a single call
+batch = pyglet.graphics.Batch()
+
 # generate vertex lists for the drawn objects
-circle1 = generateCircle(200, 200, 100, 50, color=(255, 0, 0))
-circle2 = generateCircle(350, 450, 30, 15, color=(0, 0, 255))
-rect1 = generateRectangle(250, 300, 100, 50)
-rect2 = generateRectangle(500, 200, 200, 300, color=(255, 51, 255))
-
-# when the window refreshes, re-draw all the objects (putting these all in a
-# batch doesn't seem to work, since then the last vertex of one object is
-# always connected to the first vertex of the next one)
+circle1 = generateCircle(200, 200, 100, 50, color=(255, 0, 0), batch=batch)
+circle2 = generateCircle(350, 450, 30, 15, color=(0, 0, 255), batch=batch)
+rect1 = generateRectangle(250, 300, 100, 50, batch=batch)
+rect2 = generateRectangle(500, 200, 200, 300, color=(255, 51, 255), batch=batch)
+
+# when the window refreshes, re-draw all the objects in one batched call
 @window.event
 def on_draw():
-    circle1.draw(pyglet.gl.GL_LINE_STRIP);
-    circle2.draw(pyglet.gl.GL_LINE_STRIP);
-    rect1.draw(pyglet.gl.GL_LINE_STRIP);
-    rect2.draw(pyglet.gl.GL_LINE_STRIP);
+    batch.draw()
 
 pyglet.app.run()
@@ -1,7 +1,5 @@
 import pyglet
-from random import seed, random, uniform
-from math import floor
-from datetime import datetime
+import numpy as np
 
 # PURPOSE: draw a random walk that only moves along the x and y axes in real time
 
@@ -13,12 +11,26 @@ MAX_WALK_LENGTH = 150       # maximum number of pixels one step can take
 WALK_COLOR = (255, 0, 0)    # RGB tuple for the color of the walk
 STEP_COLOR = (0, 0, 255)    # RGB tuple for color of the current step we're on
 
+# how far one unit step moves in x and y for each direction: left (0),
+# down (1), right (2), or up (3); indexing these with an array of directions
+# lets a whole batch of candidate steps be evaluated at once
+DX = np.array([ -1.0, 0.0, 1.0, 0.0 ])
+DY = np.array([ 0.0, -1.0, 0.0, 1.0 ])
+
+# number of candidate steps to randomize per batch when picking the next vertex
+PROPOSAL_BATCH = 8
+
+# the one random generator instance used by the whole walk; default_rng()
+# seeds itself from OS entropy exactly once, which replaces the old trick of
+# hashing datetime.now() into the module-level seed()
+rng = np.random.default_rng()
+
 # numbered step of the walk we're on
 step = 0
 
 # direction that the random walk should NOT go in next (so it doesn't loop
-# back on itself)
-bad_direction = None
+# back on itself); -1 means there's no previous step to avoid yet
+bad_direction = -1
 
 # generate the vertex list needed to draw a rectangle
 #
@@ -30,65 +42,57 @@ bad_direction = None
 #                       (optional)
 #
 def generateRectangle(origin_x, origin_y, width, height, color=(255, 255, 255)):
-    # note that since pyglet doesn't support GL_LINE_LOOP, you need to
-    # repeat the first vertex at the end to close the shape (this should be
-    # drawn in GL_LINE_STRIP mode)
-    return pyglet.graphics.vertex_list(5, ('v2f', (
+    # pyglet doesn't support GL_LINE_LOOP, but indexed GL_LINES close the
+    # shape just as well (each pair of indices is one edge) using only the 4
+    # unique corner vertices, and they batch cleanly with other outlines
+    # (this should be drawn in GL_LINES mode)
+    return pyglet.graphics.vertex_list_indexed(4,
+        [ 0, 1, 1, 2, 2, 3, 3, 0 ],
+        ('v2f', (
         origin_x, origin_y,
         origin_x + width, origin_y,
         origin_x + width, origin_y + height,
-        origin_x, origin_y + height,
-        origin_x, origin_y
+        origin_x, origin_y + height
     )),
-        ('c3B', color * 5))
+        ('c3B', color * 4))
 
 # calculate x and y coordinates for a vertex that doesn't go outside bounds
 #
 # @param currentVertex  :   tuple of x- and y-coordinates for the current vertex
 #
 def getNextVertex(currentVertex):
-    # functions to add length to current coordinates depending on direction
-    add = [     lambda x, l : x - l,
-                lambda y, l : y - l,
-                lambda x, l : x + l,
-                lambda y, l : y + l     ]
-
-    nextVertex = [ currentVertex[0], currentVertex[1] ]
-
     global bad_direction
 
-    # randomize the direction and length of the next step; if too "long" (would
-    # go out of bounds), randomize a new length and direction
-    # (eh probably not the best idea, but it's unlikely to hang for long)
+    # randomize the direction and length of the next step; instead of proposing
+    # one candidate step at a time in an interpreted rejection loop, randomize a
+    # whole batch of candidates with numpy and pick the first valid one -- all
+    # of the arithmetic and bounds checks happen at C speed (it's unlikely more
+    # than one batch is ever needed, since at most one direction is blocked)
     while (True):
-        # randomize if the walk is going left (0), down (1), right (2), or up (3)
-        direction = floor(random() * 4)
-
-        # randomize length of the next step
-        length = uniform(MIN_WALK_LENGTH, MAX_WALK_LENGTH)
-
-        # calculate the new coordinate for the direction we're moving in (this works)
-        newCoordinate = add[direction](currentVertex[direction % 2], length)
-
-        # make sure we're not going back in the direction we just went,
-        # and that the next step won't take us out of bounds; 'bad_direction' is just
-        # the opposite of the direction the last step went in -- if we just went to the
-        # left (direction 0), then 'bad_direction' is to the right (direction 2), etc.
-        if not direction == bad_direction :
-            # conditions to ensure new point is within bounds (depending on whether
-            # we need the coordinate to be less than some value or greater than some
-            # value to be in bounds)
-            inBounds1 = int(direction / 2) == 0 and newCoordinate > bounds[direction]
-            inBounds2 = int(direction / 2) == 1 and newCoordinate < bounds[direction]
-
-            # if either condition is true (new vertex is in bounds), set the next vertex
-            # coordinates and update 'bad_direction'
-            if inBounds1 or inBounds2 :
-                nextVertex[direction % 2] = newCoordinate
-                bad_direction = (direction + 2) % 4     # this also works
-                break
-
-    return nextVertex
+        # randomize if each candidate goes left (0), down (1), right (2), or up (3),
+        # and how many pixels it moves
+        directions = rng.integers(0, 4, size=PROPOSAL_BATCH)
+        lengths = rng.uniform(MIN_WALK_LENGTH, MAX_WALK_LENGTH, size=PROPOSAL_BATCH)
+
+        # coordinates each candidate step would land on (only one of x/y actually
+        # moves per candidate, since the walk is axis-aligned)
+        next_x = currentVertex[0] + DX[directions] * lengths
+        next_y = currentVertex[1] + DY[directions] * lengths
+
+        # a candidate is valid if it doesn't double back on the last step and
+        # stays inside the bounding box; 'bad_direction' is just the opposite of
+        # the direction the last step went in -- if we just went to the left
+        # (direction 0), then 'bad_direction' is to the right (direction 2), etc.
+        valid = (   (directions != bad_direction)
+                    & (next_x > bounds[0]) & (next_x < bounds[2])
+                    & (next_y > bounds[1]) & (next_y < bounds[3])   )
+
+        if valid.any():
+            # take the first valid candidate and update 'bad_direction'
+            i = np.argmax(valid)
+            bad_direction = (directions[i] + 2) % 4
+
+            return [ float(next_x[i]), float(next_y[i]) ]
 
 # perform one step of the random walk
 #
@@ -97,10 +101,13 @@ def getNextVertex(currentVertex):
 #                   of time between calls? i.e. 0.1 seconds for this program)
 #
 def walkStep(dt):
-    global step, walk, currentVertex, lastLine
+    global step, currentVertex
 
-    # don't add any more lines than MAX_STEPS to the walk
-    if step == MAX_STEPS:
+    # don't add any more lines than MAX_STEPS to the walk; once the walk is
+    # full, take this callback off the clock entirely instead of letting it
+    # keep firing 10 times a second doing nothing
+    if step >= MAX_STEPS:
+        pyglet.clock.unschedule(walkStep)
         return
 
     # get the next randomized vertex
@@ -108,13 +115,11 @@ def walkStep(dt):
 
     # re-color the last line of the walk the standard color so we can color
     # this new step a different color
-    lastLine.colors = WALK_COLOR * 2
+    walk.colors[6 * step - 6 : 6 * step] = WALK_COLOR * 2
 
-    # add this new step to the walk and save ther vertex list used to draw
-    # its line
-    lastLine = walk.add (2, pyglet.gl.GL_LINES, None,
-                        ('v2f/static', currentVertex + nextVertex),
-                        ('c3B/dynamic', WALK_COLOR + STEP_COLOR))
+    # write this new step's line into its slice of the preallocated buffer
+    walk.vertices[4 * step : 4 * step + 4] = currentVertex + nextVertex
+    walk.colors[6 * step : 6 * step + 6] = WALK_COLOR + STEP_COLOR
 
     currentVertex = nextVertex
     step = step + 1
@@ -123,9 +128,6 @@ def walkStep(dt):
 # create a 16:9 aspect ratio window
 window = pyglet.window.Window(WINDOW_WIDTH, WINDOW_HEIGHT)
 
-# seed the random generator
-seed(datetime.now())
-
 # draw a (white) bounding box for the walk
 boundingBox = generateRectangle(    0.1 * WINDOW_WIDTH,
                                     0.1 * WINDOW_HEIGHT,
@@ -135,28 +137,32 @@ boundingBox = generateRectangle(    0.1 * WINDOW_WIDTH,
 # bounds for the left, bottom, right, and top sides of the bounding box
 bounds = [ 0.1 * WINDOW_WIDTH, 0.1 * WINDOW_HEIGHT, 0.9 * WINDOW_WIDTH, 0.9 * WINDOW_HEIGHT ]
 
-# create a batch to hold all of the individual lines in the walk; note that NOT
-# using a batch for the individual lines (i.e. making one big vertex list for
-# all the vertices) and then using GL_LINES or GL_LINE_STRIP mode causes each
-# vertex to always have a line drawn to it from the origin for some reason,
-# giving the walk a weird vanishing point effect
-walk = pyglet.graphics.Batch()
+# preallocate a single vertex list big enough to hold every line in the walk,
+# instead of allocating a tiny new vertex list for each step; each step just
+# writes its two vertices into its own slice of the buffer, so the whole walk
+# stays one GPU buffer and one draw call no matter how long it gets (drawn in
+# GL_LINES mode, so every pair of vertices is an independent line)
+#
+# the unused segments start out as zero-length lines at the origin with black
+# colors, which makes them invisible until a step fills them in
+walk = pyglet.graphics.vertex_list( 2 * MAX_STEPS,
+                                    ('v2f/dynamic', [ 0.0 ] * (4 * MAX_STEPS)),
+                                    ('c3B/dynamic', [ 0 ] * (6 * MAX_STEPS)) )
 
 # randomize the walk's starting vertex (the max/min values are adjusted so that the
 # first vertex isn't so close to the bounding walls that the walk is hard to see)
-currentVertex = [   uniform(0.15 * WINDOW_WIDTH, 0.75 * WINDOW_HEIGHT),
-                    uniform(0.15 * WINDOW_WIDTH, 0.75 * WINDOW_HEIGHT)  ]
+currentVertex = [   rng.uniform(0.15 * WINDOW_WIDTH, 0.75 * WINDOW_HEIGHT),
+                    rng.uniform(0.15 * WINDOW_WIDTH, 0.75 * WINDOW_HEIGHT)  ]
 
 # we also need to set the second vertex before starting the walk, since we
 # draw the walk as a GL_LINES, which needs two vertices to be drawn
 nextVertex = getNextVertex(currentVertex)
 
-# we add this first line to the batch and save the vertex list used to draw it
-# so we can alter its color later (we color the current step of the walk a different
-# color from the previous steps so it's easier to see)
-lastLine = walk.add (2, pyglet.gl.GL_LINES, None,
-                    ('v2f/static', currentVertex + nextVertex),
-                    ('c3B/dynamic', WALK_COLOR + STEP_COLOR))
+# write the first line into the front of the walk buffer (we color the current
+# step of the walk a different color from the previous steps so it's easier
+# to see)
+walk.vertices[0:4] = currentVertex + nextVertex
+walk.colors[0:6] = WALK_COLOR + STEP_COLOR
 
 # update the new current vertex so we know which one we're on and increment the
 # step counter
@@ -169,7 +175,7 @@ pyglet.clock.schedule_interval(walkStep, .1)
 # draw the bounding box and the walk on the main window
 @window.event
 def on_draw():
-    boundingBox.draw(pyglet.gl.GL_LINE_STRIP)
-    walk.draw()
+    boundingBox.draw(pyglet.gl.GL_LINES)
+    walk.draw(pyglet.gl.GL_LINES)
 
 pyglet.app.run()
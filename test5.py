@@ -1,5 +1,7 @@
 import pyglet
-from math import sqrt, radians, sin, cos
+import numpy as np
+from functools import lru_cache
+from math import sqrt
 
 # PURPOSE:  1) add the option of filling in shapes with color and
 #           2) draw lines with adjustable thickness
@@ -10,6 +12,31 @@ from math import sqrt, radians, sin, cos
 WINDOW_WIDTH = 960          # width of the main window
 WINDOW_HEIGHT = 540         # height of the main window
 
+# cache of unit-circle vertex tables, keyed by the number of vertices used to
+# draw the circle (see getUnitCircle in test3.py; the same few vertex counts
+# tend to get reused, so the trig for a given count is only evaluated once)
+unit_circle_cache = {}
+
+# get the interleaved [x1, y1, x2, y2, ...] coordinates of a circle of radius
+# 1 about the origin (the first vertex is repeated at the end to close the
+# circle)
+#
+# @param num_points :   number of vertices used to draw the circle
+#
+def getUnitCircle(num_points):
+    unit = unit_circle_cache.get(num_points)
+
+    if unit is None:
+        theta = np.arange(num_points + 1) * (2.0 * np.pi / num_points)
+
+        unit = np.empty(2 * (num_points + 1), dtype=np.float32)
+        unit[0::2] = np.sin(theta)
+        unit[1::2] = np.cos(theta)
+
+        unit_circle_cache[num_points] = unit
+
+    return unit
+
 # generate the vertex list needed to draw a filled rectangle
 #
 # @param origin     :   tuple of x- and y-coordinates for the bottom left corner of rectangle
@@ -19,6 +46,11 @@ WINDOW_HEIGHT = 540         # height of the main window
 #                       (optional)
 # @param batch      :   batch to add vertex list to (optional)
 #
+# construction is memoized: asking for the same rectangle again returns the
+# previously built vertex list instead of rebuilding and re-uploading it, so
+# every argument needs to be hashable (pass 'origin' as a tuple)
+#
+@lru_cache(maxsize=128)
 def generateFilledRectangle(origin, width, height, color=(255, 255, 255), batch=None):
     # if no batch is specified, just return the vertex list used to make the rectangle (should
     # be drawn in GL_TRIANGLES mode)
@@ -54,30 +86,38 @@ def generateFilledRectangle(origin, width, height, color=(255, 255, 255), batch=
 #                       (optional)
 # @param batch      :   batch to add vertex list to (optional)
 #
+# construction is memoized the same way as generateFilledRectangle (pass
+# 'center' as a tuple)
+#
+@lru_cache(maxsize=128)
 def generateFilledCircle(center, radius, num_points, color=(255, 255, 255), batch=None):
     # note: this function is pretty much the same as the one for circles in test3.py, but we'll
     # order the vertices of list differently at the end to use GL_TRIANGLES instead of
     # GL_LINE_STRIP (fewer comments as a result)
 
-    vertices = [ center[0], center[1] + radius ]
-
-    angle = radians(360.0 / num_points)
-    cosine = cos(angle)
-    sine = sin(angle)
+    # scale and translate a cached unit circle with the requested number of
+    # vertices; repeated calls with the same 'num_points' skip the trig entirely
+    ring = getUnitCircle(num_points) * radius
+    ring[0::2] += center[0]
+    ring[1::2] += center[1]
 
-    current_x, current_y = 0, radius
-
-    for i in range(num_points):
-        new_x = current_x * cosine - current_y * sine
-        new_y = current_x * sine + current_y * cosine
-        vertices += [ new_x + center[0], new_y + center[1]]
-        current_x, current_y = new_x, new_y
+    # prepend the center of the circle (as vertex 0) and keep the whole buffer
+    # as float32, so pyglet can fill the GL buffer straight from it instead of
+    # unboxing a Python float per coordinate
+    vertices = np.empty(2 * (num_points + 2), dtype=np.float32)
+    vertices[0] = center[0]
+    vertices[1] = center[1]
+    vertices[2:] = ring
 
     # we will add the center of the circle to the list of vertices (as vertex 0); each
     # triangle will be made up of two adjacent vertices on the circle and the center vertex
-    order = []
-    for i in range(1, num_points + 1):
-        order += [ 0, i, i+1 ]
+    #
+    # preallocate the index list at its final size and fill it with strided slice
+    # assignments instead of growing it 3 elements at a time (which reallocates
+    # the list and builds a throwaway 3-element list every iteration)
+    order = [ 0 ] * (3 * num_points)
+    order[1::3] = range(1, num_points + 1)
+    order[2::3] = range(2, num_points + 2)
 
     # if a batch is not specified, return the vertex list for the circle (needs to be drawn
     # in GL_TRIANGLES mode)
@@ -86,14 +126,49 @@ def generateFilledCircle(center, radius, num_points, color=(255, 255, 255), batc
         # 'num_points' vertices around the circle, and the first vertex (at the top
         # of the circle) repeated (so the circle closes)
         return  pyglet.graphics.vertex_list_indexed(num_points + 2, order,
-                ('v2f', center + vertices),
-                ('c3B', color * (num_points + 2)))
+                ('v2f', vertices),
+                ('c3B', bytes(color) * (num_points + 2)))
 
     # if a batch is specified, add the circle to the batch and return its vertex list
     else:
         return  batch.add_indexed(num_points + 2, pyglet.gl.GL_TRIANGLES, None, order,
-                ('v2f', center + vertices),
-                ('c3B', color * (num_points + 2)))
+                ('v2f', vertices),
+                ('c3B', bytes(color) * (num_points + 2)))
+
+# calculate the four corner coordinates of the rectangle representing a
+# thickened line (see generateLine below); the pure scalar math lives in its
+# own function so it's isolated from the pyglet/vertex list plumbing -- this
+# is also exactly the kind of small numeric kernel a JIT compiler could
+# specialize, if one were ever added to these examples
+#
+# the corners are just the line's endpoints pushed half the width along the
+# line's unit normal, which handles horizontal, vertical and diagonal lines
+# with one formula (the corners come back starting at the top left and going
+# in counter-clockwise order)
+#
+# @param p1_x, p1_y :   first endpoint of the line
+# @param p2_x, p2_y :   second endpoint of the line
+# @param width      :   width (thickness) of the line in pixels
+#
+def generateLineCorners(p1_x, p1_y, p2_x, p2_y, width):
+    delta_x = p2_x - p1_x
+    delta_y = p2_y - p1_y
+    length = sqrt(delta_x * delta_x + delta_y * delta_y)
+
+    # half-width offset along the line's unit normal; a zero-length "line"
+    # has no direction to take a normal from, so fall back to a degenerate
+    # (zero-area) rectangle at the point instead of dividing by zero
+    if length > 0.0:
+        offset_x = -delta_y / length * 0.5 * width
+        offset_y = delta_x / length * 0.5 * width
+    else:
+        offset_x = 0.5 * width
+        offset_y = 0.0
+
+    return (    p1_x + offset_x, p1_y + offset_y,
+                p1_x - offset_x, p1_y - offset_y,
+                p2_x - offset_x, p2_y - offset_y,
+                p2_x + offset_x, p2_y + offset_y    )
 
 # generate vertex list needed to draw a line of arbitrary thickness
 #
@@ -124,102 +199,63 @@ def generateLine(p1, p2, color=(255, 255, 255), width=1.0, batch=None):
     # lines of thickness > 1.0 need to be triangulated, since GL_TRIANGLES are filled with color
     else:
         # a thick line is basically a (rotated) rectangle, so we just find the four
-        # corners of the rectangle and triangulate it
+        # corners of the rectangle and triangulate it; the corner math works
+        # directly from the endpoints and the line's unit normal (no slope
+        # division that blows up for near-vertical lines, and the caller's
+        # points are never written to)
+        q1_x, q1_y, q2_x, q2_y, q3_x, q3_y, q4_x, q4_y = \
+                generateLineCorners(p1[0], p1[1], p2[0], p2[1], width)
 
-        # deal with horizontal and vertical lines by just using generateFilledRectangle()
-        if p2[0] == p1[0]:  # vertical line
-            # calculate the coordinates for the bottom left corner of the rectangle
-            if p1[1] <= p2[1]:
-                origin = [ p1[0] - 0.5 * width, p1[1] ]
-            else:
-                origin = [ p2[0] - 0.5 * width, p2[1] ]
-
-            return generateFilledRectangle(origin, width, abs(p2[1] - p1[1]), color=color, batch=batch)
-
-        elif p2[1] == p1[1]:    # horizontal line
-            if p1[0] <= p2[0]:
-                origin = [ p1[0], p1[1] - 0.5 * width ]
-            else:
-                origin = [ p2[0], p2[1] - 0.5 * width ]
-
-            return generateFilledRectangle(origin, abs(p2[0] - p1[0]), width, color=color, batch=batch)
+        # if a batch is not specified, return the vertex list for the rectangle (needs to be drawn
+        # in GL_TRIANGLES mode)
+        if batch is None:
+            # use the rectangle 's4 vertices to form the two adjacent triangles; the indices
+            # show which vertices we use the make the triangle (the first triangle is made of
+            # q1/q2/q4, etc.)
+            return  pyglet.graphics.vertex_list_indexed(4,
+                    [0, 1, 3, 2, 1, 3],
+                    ('v2f', (   q1_x, q1_y,
+                                q2_x, q2_y,
+                                q3_x, q3_y,
+                                q4_x, q4_y  )),
+                    ('c3B', color * 4))
 
-        # deal with lines not parallel to the x or y axes
+        # if a batch is specified, add the rectangle to the batch and return its vertex list
         else:
-            # since the angle the rectangle is rotated (counter-clockwise, about the midpoint of the line)
-            # is the arctangent of the slope of the line, multiplying the corner coordinates by the Cartesian
-            # rotation matrix involves sin( arctan(x) ) and cos( arctan(x) ) terms, which simplify into
-            # expressions only involving square roots
-            slope = float((p2[1] - p1[1]) / (p2[0] - p1[0]))
-            cosine = 1.0 / sqrt(1 + slope ** 2)
-            sine = cosine * slope
-
-            # first, we translate the line's endpoints so its midpoint would be at the origin;
-            # then the rectangle's resulting corner points (q1, q2, q3, q4 -- starting at the top
-            # left corner and going in counter-clockwise order) are multiplied by the Cartesian
-            # rotation matrix to produce the points of the rectangle that represents the thickened
-            # line; we then translate the rotated rectangle back so its center point is at the
-            # original midpoint of the line
-            mid_x = 0.5 * (p1[0] + p2[0])
-            mid_y = 0.5 * (p1[1] + p2[1])
-
-            p1[0] = p1[0] - mid_x
-            p1[1] = p1[1] - mid_y
-            p2[0] = p2[0] - mid_x
-            p2[1] = p2[1] - mid_y
-
-            # note: this is a lil ugly; I should probably change the names of the corner coordinates
-            # to something other than q1_y, etc.
-            q1_x = p1[0] * cosine - (p1[1] + 0.5 * width) * sine + mid_x
-            q1_y = p1[0] * sine + (p1[1] + 0.5 * width) * cosine + mid_y
-            q2_x = p1[0] * cosine - (p1[1] - 0.5 * width) * sine + mid_x
-            q2_y = p1[0] * sine + (p1[1] - 0.5 * width) * cosine + mid_y
-            q3_x = p2[0] * cosine - (p2[1] - 0.5 * width) * sine + mid_x
-            q3_y = p2[0] * sine + (p2[1] - 0.5 * width) * cosine + mid_y
-            q4_x = p2[0] * cosine - (p2[1] + 0.5 * width) * sine + mid_x
-            q4_y = p2[0] * sine + (p2[1] + 0.5 * width) * cosine + mid_y
-
-            # if a batch is not specified, return the vertex list for the rectangle (needs to be drawn
-            # in GL_TRIANGLES mode)
-            if batch is None:
-                # use the rectangle 's4 vertices to form the two adjacent triangles; the indices
-                # show which vertices we use the make the triangle (the first triangle is made of
-                # q1/q2/q4, etc.)
-                return  pyglet.graphics.vertex_list_indexed(4,
-                        [0, 1, 3, 2, 1, 3],
-                        ('v2f', (   q1_x, q1_y,
-                                    q2_x, q2_y,
-                                    q3_x, q3_y,
-                                    q4_x, q4_y  )),
-                        ('c3B', color * 4))
-
-            # if a batch is specified, add the rectangle to the batch and return its vertex list
-            else:
-                return batch.add_indexed(4, pyglet.gl.GL_TRIANGLES, None,
-                                        [0, 1, 3, 2, 1, 3],
-                                        ('v2f', (   q1_x, q1_y,
-                                                    q2_x, q2_y,
-                                                    q3_x, q3_y,
-                                                    q4_x, q4_y) ),
-                                        ('c3B', color * 4))
+            return batch.add_indexed(4, pyglet.gl.GL_TRIANGLES, None,
+                                    [0, 1, 3, 2, 1, 3],
+                                    ('v2f', (   q1_x, q1_y,
+                                                q2_x, q2_y,
+                                                q3_x, q3_y,
+                                                q4_x, q4_y) ),
+                                    ('c3B', color * 4))
 
 
 # create the main 16:9 aspect ratio window
 window = pyglet.window.Window(WINDOW_WIDTH, WINDOW_HEIGHT)
 
-# draw some lines, rectangles, and circles (all filled with color)
-@window.event
-def on_draw():
-    generateLine([100, 100], [400, 400], color=(66, 90, 245)).draw(pyglet.gl.GL_LINES)
-    generateLine([200, 200], [700, 350], width=5.0, color=(245, 66, 66)).draw(pyglet.gl.GL_TRIANGLES)
-    generateLine([250, 350], [750, 175], width=10.5).draw(pyglet.gl.GL_TRIANGLES)
-    generateLine([400, 50], [400, 300], width=3.5, color=(0, 255, 0)).draw(pyglet.gl.GL_TRIANGLES)
-    generateLine([700, 450], [850, 450], width=7.5, color=(194, 245, 66)).draw(pyglet.gl.GL_TRIANGLES)
+# batch holding all of the drawn shapes; none of them ever change, so they're
+# built exactly once here rather than regenerated (vertex math, new vertex
+# list, GPU buffer upload and all) on every single frame inside on_draw
+batch = pyglet.graphics.Batch()
+
+# some lines, rectangles, and circles (all filled with color)
+generateLine([100, 100], [400, 400], color=(66, 90, 245), batch=batch)
+generateLine([200, 200], [700, 350], width=5.0, color=(245, 66, 66), batch=batch)
+generateLine([250, 350], [750, 175], width=10.5, batch=batch)
+generateLine([400, 50], [400, 300], width=3.5, color=(0, 255, 0), batch=batch)
+generateLine([700, 450], [850, 450], width=7.5, color=(194, 245, 66), batch=batch)
 
-    generateFilledRectangle([50, 400], 200, 100).draw(pyglet.gl.GL_TRIANGLES)
-    generateFilledRectangle([750, 80], 150, 300, color=(245, 158, 66)).draw(pyglet.gl.GL_TRIANGLES)
+generateFilledRectangle((50, 400), 200, 100, batch=batch)
+generateFilledRectangle((750, 80), 150, 300, color=(245, 158, 66), batch=batch)
 
-    generateFilledCircle([100, 100], 50, 15).draw(pyglet.gl.GL_TRIANGLES)
-    generateFilledCircle([450, 450], 75, 25, color=(126, 66, 245)).draw(pyglet.gl.GL_TRIANGLES)
+generateFilledCircle((100, 100), 50, 15, batch=batch)
+generateFilledCircle((450, 450), 75, 25, color=(126, 66, 245), batch=batch)
+
+# with every shape prebuilt, refreshing the window is just one batched draw
+@window.event
+def on_draw():
+    window.clear()
+    batch.draw()
 
 pyglet.app.run()
@@ -1,6 +1,7 @@
 import pyglet
-from math import floor
-from random import random
+import numpy as np
+import os
+from random import randbytes, randrange
 import test6_functions as graphics
 
 # PURPOSE: draw a grid that the user can move along with the arrow keys
@@ -12,59 +13,138 @@ GRID_ROWS = 10              # number of rows in the main grid
 GRID_COLS = 10              # number of columns in the main grid
 CIRCLE_DRAW_POINTS = 30     # number of vertices used to draw circles
 
+# capital-letter column labels (A, B, C, ...), generated once here instead of
+# calling chr() for every label of every grid
+COLUMN_ALPHA = tuple(chr(65 + i) for i in range(26))
+
+# group that translates everything drawn in it by (x, y) on the GL matrix
+# stack; this lets the user's circle live inside a shared batch while still
+# being positioned by a single translation instead of rewritten vertices
+class TranslationGroup(pyglet.graphics.OrderedGroup):
+    def __init__(self, x, y, order, parent=None):
+        super().__init__(order, parent)
+        self.x = x
+        self.y = y
+
+    def set_state(self):
+        pyglet.gl.glPushMatrix()
+        pyglet.gl.glTranslatef(self.x, self.y, 0.0)
+
+    def unset_state(self):
+        pyglet.gl.glPopMatrix()
+
 # class to represent grid
 class Grid:
-    # initialize an instance of the Grid object
-    def __init__(self, origin, width, height, rows, cols, color=(255, 255, 255), thickness=1.0, label=False, alpha=False, labelColor=(255, 255, 255, 255)):
-        self.origin = origin
+    # fix the set of instance attributes up front; slotted instances skip the
+    # per-instance attribute dict, so reads like self.cellCenterX are direct
+    # offsets and each grid takes less memory ('draw' is a slot because
+    # __init__ binds it to one of the two draw variants below)
+    __slots__ = (   'origin', 'width', 'height', 'rows', 'cols', 'color',
+                    'thickness', 'cellSpacing', 'cellCenterX', 'cellCenterY',
+                    'cellLabels', 'batch', 'label', 'alpha', 'labelBatch',
+                    'draw'  )
+
+    # initialize an instance of the Grid object; if 'batch' is given, the grid
+    # (and its labels) are added to that shared batch instead of making their
+    # own, with 'group'/'labelGroup' controlling their draw order within it
+    def __init__(self, origin, width, height, rows, cols, color=(255, 255, 255), thickness=1.0, label=False, alpha=False, labelColor=(255, 255, 255, 255), batch=None, group=None, labelGroup=None):
+        # keep the origin as an immutable tuple of unboxed-friendly floats
+        self.origin = (float(origin[0]), float(origin[1]))
         self.width = width
         self.height = height
         self.rows = rows
         self.cols = cols
-        self.color = color
+        # store the color as a packed uint8 buffer; repeating bytes to color a
+        # whole vertex list is a single C-level copy instead of building an
+        # ever-larger tuple of Python ints
+        self.color = bytes(color)
         self.thickness = thickness
 
+        # the grid's dimensions are fixed once it's built, so precompute the
+        # center coordinate of every row and column (plus the cell spacing and
+        # every cell's label string) up front; the getters below then become
+        # plain table lookups instead of redoing divisions and string building
+        # on every call
+        # (note that division already returns a float, so there's no need to
+        # cast the dimensions first)
+        horizontal_space = width / cols
+        vertical_space = height / rows
+        self.cellSpacing = [ horizontal_space, vertical_space ]
+        self.cellCenterX = [ origin[0] + horizontal_space * (c + 0.5) for c in range(cols) ]
+        self.cellCenterY = [ origin[1] + vertical_space * (r + 0.5) for r in range(rows) ]
+
+        if alpha:
+            self.cellLabels = [ [ COLUMN_ALPHA[c] + str(r + 1) for c in range(cols) ]
+                                for r in range(rows) ]
+        else:
+            self.cellLabels = [ [ str(c + 1) + "-" + str(r + 1) for c in range(cols) ]
+                                for r in range(rows) ]
+
         # get the batch of the grid for drawing
-        self.batch = generateGrid(self.origin, self.width, self.height, self.rows, self.cols, self.color, self.thickness)
+        self.batch = generateGrid(self.origin, self.width, self.height, self.rows, self.cols, self.color, self.thickness, batch=batch, group=group)
 
         # get the batch of grid labels, if requested (otherwise labelBatch is None)
         self.label = label
         self.alpha = alpha
-        self.labelBatch = self.generateLabels(labelColor)
+        self.labelBatch = self.generateLabels(labelColor, batch=batch, group=labelGroup)
+
+        # pick the right draw variant once here, so drawing doesn't re-check
+        # whether the grid has labels on every single frame; when the labels
+        # went into the same shared batch as the grid lines, drawing the grid
+        # batch already draws them, so drawing the label batch separately
+        # would render the whole batch twice
+        if label and self.labelBatch is not self.batch:
+            self.draw = self.drawWithLabels
+        else:
+            self.draw = self.drawWithoutLabels
 
-    # draw the grid
-    def draw(self):
+    # draw the grid without labels ('draw' is bound to one of these two
+    # variants when the grid is built; note that if the grid shares its batch
+    # with other objects, drawing that batch draws them too)
+    def drawWithoutLabels(self):
         self.batch.draw()
 
-        # draw the grid's labels, if it has any
-        if self.label is True:
-            self.labelBatch.draw()
+    # draw the grid and its (separately batched) labels
+    def drawWithLabels(self):
+        self.batch.draw()
+        self.labelBatch.draw()
 
     # get the coordinates of the center of the cell at (row, col)
     def getCellCenter(self, row, col):
-        center_x = self.origin[0] + float(self.width) / self.cols * (col + 0.5)
-        center_y = self.origin[1] + float(self.height) / self.rows * (row + 0.5)
-
-        return [ center_x, center_y ]
+        return [ self.cellCenterX[col], self.cellCenterY[row] ]
 
     # get the horizontal and vertical spacing between cells in the grid
     def getSpacing(self):
-        return [ float(self.width) / self.cols, float(self.height) / self.rows ]
+        return list(self.cellSpacing)
 
     # generate a batch of labels for cells along the left and top sides of the grid
     # if self.alpha = True, columns are labelled with capital letters (A, B, C, ...)
     # otherwise, both rows and columns are numbered
     #
     # note that labelColor is RGBA, not RGB
-    def generateLabels(self, labelColor):
-        if self.label is False:
+    def generateLabels(self, labelColor, batch=None, group=None):
+        if not self.label:
             return None
 
-        labelBatch = pyglet.graphics.Batch()
+        # add the labels to the shared batch if one was given, otherwise make
+        # a batch of their own
+        labelBatch = batch if batch is not None else pyglet.graphics.Batch()
+
+        # resolve the label font once up front -- constructing a Label with a
+        # font name makes pyglet walk its font registry, and that lookup
+        # doesn't need to be repeated for every single label
+        font = pyglet.font.load('Times New Roman', 10)
 
-        # positioning for column/row labels
-        horizontal_space = float(self.width) / self.cols
-        vertical_space = float(self.height) / self.rows
+        # build the numeric label strings one time for both loops
+        numbers = [ str(i + 1) for i in range(max(self.rows, self.cols)) ]
+
+        # bind the Label constructor to a local so the loops don't repeat the
+        # pyglet.text.Label attribute walk for every label
+        Label = pyglet.text.Label
+
+        # positioning for column/row labels (the cell spacing was already
+        # computed when the grid was built)
+        horizontal_space, vertical_space = self.cellSpacing
 
         col_pos = self.getCellCenter(self.rows - 1, 0)
         col_pos[1] = col_pos[1] + vertical_space
@@ -72,39 +152,40 @@ class Grid:
         row_pos = self.getCellCenter(0, 0)
         row_pos[0] = row_pos[0] - horizontal_space
 
+        # column label strings: letters or numbers, decided once out here
+        # instead of re-checking inside the loop
+        column_text = COLUMN_ALPHA if self.alpha else numbers
+
         # create labels for the columns
         for i in range(self.cols):
-            if self.alpha is True:
-                text = chr(65 + i)
-            else:
-                text = str(i + 1)
-
-            pyglet.text.Label(  text,
-                                font_name = 'Times New Roman',
+            Label(  column_text[i],
+                                font_name = font.name,
                                 font_size = 10,     # TODO: this should adjust with grid size
                                 x = col_pos[0],
                                 anchor_x = 'left',
                                 y = col_pos[1],
                                 anchor_y = 'bottom',
                                 color = labelColor,
-                                batch = labelBatch  )
+                                batch = labelBatch,
+                                group = group   )
 
             col_pos[0] = col_pos[0] + horizontal_space
 
         # create labels for the rows
         for i in range(self.rows):
-            text = str(i + 1)
+            text = numbers[i]
 
             # TODO: for some reason the row labels aren't completely centered vertically
-            pyglet.text.Label(  text,
-                                font_name = 'Times New Roman',
+            Label(  text,
+                                font_name = font.name,
                                 font_size = 10,     # TODO: this should adjust with grid size
                                 x = row_pos[0],
                                 anchor_x = 'left',
                                 y = row_pos[1],
                                 anchor_y = 'bottom',
                                 color = labelColor,
-                                batch = labelBatch  )
+                                batch = labelBatch,
+                                group = group   )
 
             row_pos[1] = row_pos[1] + vertical_space
 
@@ -112,33 +193,44 @@ class Grid:
 
     # get the text of the label for this cell
     def getCellLabel(self, row, col):
-        if self.alpha is True:
-            return chr(65 + col) + str(row + 1)
-        else:
-            return str(col + 1) + "-" + str(row + 1)
+        return self.cellLabels[row][col]
 
 # class to represent user's position and circle
 class User:
-    # initialize an instance of the User object
-    def __init__(self, grid, row, col, color=(255, 255, 255)):
+    # see Grid.__slots__ above; the user's attribute set is fixed too
+    __slots__ = ( 'grid', 'row', 'col', 'color', 'center', 'radius', 'batch', 'group', 'circle' )
+
+    # initialize an instance of the User object; if 'batch' is given, the
+    # user's circle is added to that shared batch instead of making its own
+    # ('order' sets its draw order within the batch)
+    def __init__(self, grid, row, col, color=(255, 255, 255), batch=None, order=0):
         self.grid = grid        # instance of the Grid object the User is contained in
         self.row = row
         self.col = col
         self.color = color
 
-        # create the vertex list needed to draw the user's circle on the grid (the radius is adjusted to fit
-        # within the grid cells)
+        # create the vertex list needed to draw the user's circle (the radius is adjusted to fit
+        # within the grid cells); the circle is generated in its own local space, centered about
+        # the origin, and translated onto its grid cell by its TranslationGroup at draw time --
+        # that way moving the user only means changing the translation, instead of rewriting
+        # (and re-uploading) every vertex in the circle from Python
         self.center = self.grid.getCellCenter(self.row, self.col)
-        self.radius = 0.25 * min(float(self.grid.width) / self.grid.cols, float(self.grid.height) / self.grid.rows)
-        self.circle = graphics.generateCircle(  self.center,
+        self.radius = 0.25 * min(self.grid.width / self.grid.cols, self.grid.height / self.grid.rows)
+
+        self.batch = batch if batch is not None else pyglet.graphics.Batch()
+        self.group = TranslationGroup(self.center[0], self.center[1], order)
+        self.circle = graphics.generateCircle(  [ 0, 0 ],
                                                 self.radius,
                                                 CIRCLE_DRAW_POINTS,
                                                 color = self.color,
-                                                fill = True )
+                                                fill = True,
+                                                batch = self.batch,
+                                                group = self.group  )
 
-    # draw the user's circle
+    # draw the user's circle (note that if the user shares a batch with other
+    # objects, drawing that batch draws them too)
     def draw(self):
-        self.circle.draw(pyglet.gl.GL_TRIANGLES)
+        self.batch.draw()
 
     # moveTo: move the user's circle to a new cell and update its position
     #
@@ -146,22 +238,11 @@ class User:
     # @param next_col   :   column of cell the user is moving to
     #
     def moveTo(self, next_row, next_col):
-        nextCenter = self.grid.getCellCenter(next_row, next_col)
-        deltaX = nextCenter[0] - self.center[0]
-        deltaY = nextCenter[1] - self.center[1]
-
-        # translate the circle by adding the change in position to each
-        # pair of coordinates in the circle's vertex list
-        for i in range(len(self.circle.vertices)):
-            # even indices in the vertices list are x-coordinate values; odd
-            # indices are y-coordinate values
-            if i % 2 == 0:
-                self.circle.vertices[i] = self.circle.vertices[i] + deltaX
-            else:
-                self.circle.vertices[i] = self.circle.vertices[i] + deltaY
-
-        # update the user's position in the grid
-        self.center = nextCenter
+        # the circle's vertices live in local space, so moving is just a matter
+        # of pointing the group's draw-time translation at the new cell center
+        self.center = self.grid.getCellCenter(next_row, next_col)
+        self.group.x = self.center[0]
+        self.group.y = self.center[1]
         self.row = next_row
         self.col = next_col
 
@@ -176,35 +257,129 @@ class User:
 #                       (optional)
 # @param thickness  :   thickness of grid lines (optional)
 #
-def generateGrid(origin, width, height, rows, cols, color=(255, 255, 255), thickness=1.0):
-    # create the batch of vertex lists used to draw the grid
-    grid = pyglet.graphics.Batch()
-
-    # generate all the horizontal lines in the grid
-    for i in range(rows + 1):
-        # calculate the number of empty pixels between each row's grid line
-        # TODO: incorporate thickness into calculation
-        vertical_space = float(height) / rows
-
-        graphics.generateLine(  [ origin[0], origin[1] + i * vertical_space ],
-                                [ origin[0] + width, origin[1] + i * vertical_space ],
-                                color=color, width=thickness, batch=grid    )
-
-    # generate all the vertical lines in the grid
-    for i in range(cols + 1):
-        # calculate the number of empty pixels between each column's grid line
-        # TODO: incorporate thickness into calculation
-        horizontal_space = float(width) / cols
-
-        graphics.generateLine(  [ origin[0] + i * horizontal_space, origin[1] ],
-                                [ origin[0] + i * horizontal_space, origin[1] + height ],
-                                color=color, width=thickness, batch=grid    )
+# TODO: for much larger grids it would be better to render the grid pattern
+# analytically in a fragment shader on a single full-screen quad (4 vertices
+# total, with anti-aliasing for free via fwidth()) instead of uploading one
+# primitive per line; the legacy pyglet graphics API used by these examples
+# has no shader support, so that rewrite has to wait for a move to pyglet 2
+#
+def generateGrid(origin, width, height, rows, cols, color=(255, 255, 255), thickness=1.0, batch=None, group=None):
+    # create the batch used to draw the grid, unless the caller wants the grid
+    # added to a shared batch (with 'group' setting its draw order within it)
+    grid = batch if batch is not None else pyglet.graphics.Batch()
+
+    # calculate the number of empty pixels between neighboring grid lines
+    # TODO: incorporate thickness into calculation
+    ox, oy = origin[0], origin[1]
+    vertical_space = height / rows
+    horizontal_space = width / cols
+
+    num_lines = (rows + 1) + (cols + 1)
+
+    # the grid's buffers are a pure function of the arguments, so cache them
+    # on disk keyed by those arguments; later runs of the program load the
+    # finished arrays straight off disk instead of rebuilding every line
+    # (the filename spells out the parameter values rather than hashing them,
+    # since Python's hash() is salted differently on every run)
+    cache_file = (  '.gridcache_'
+                    + '_'.join(str(v) for v in (ox, oy, width, height, rows, cols, thickness))
+                    + '_' + bytes(color).hex() + '.npz'  )
+
+    if os.path.exists(cache_file):
+        cached = np.load(cache_file)
+        coords = cached['coords']
+        colors = cached['colors']
+        indices = cached['indices']
+
+    # instead of routing every grid line through graphics.generateLine() --
+    # which packs its own tuples and adds its own entry to the batch per line
+    # -- build the coordinates for ALL the lines up front and hand them to the
+    # batch as one interleaved vertex list, so the whole grid is a single
+    # contiguous buffer and a single draw call
+
+    # thin grid lines are plain GL_LINES, two vertices per line
+    elif thickness <= 1.0:
+        coords = [ 0.0 ] * (4 * num_lines)
+        k = 0
+
+        # all the horizontal lines in the grid
+        for i in range(rows + 1):
+            y = oy + i * vertical_space
+            coords[k : k + 4] = [ ox, y, ox + width, y ]
+            k += 4
+
+        # all the vertical lines in the grid
+        for i in range(cols + 1):
+            x = ox + i * horizontal_space
+            coords[k : k + 4] = [ x, oy, x, oy + height ]
+            k += 4
+
+        coords = np.asarray(coords, dtype=np.float32)
+        colors = np.frombuffer(bytes(color) * (2 * num_lines), dtype=np.uint8)
+        indices = np.empty(0, dtype=np.int32)
+
+        np.savez(cache_file, coords=coords, colors=colors, indices=indices)
+
+    # thick grid lines are axis-aligned rectangles: four corner vertices and
+    # two triangles (six indices) per line
+    else:
+        half = 0.5 * thickness
+        coords = [ 0.0 ] * (8 * num_lines)
+        k = 0
+
+        # all the horizontal lines in the grid (corners are listed in
+        # counter-clockwise order, starting at the bottom left)
+        for i in range(rows + 1):
+            y_bottom = oy + i * vertical_space - half
+            y_top = y_bottom + thickness
+            coords[k : k + 8] = [   ox, y_bottom, ox + width, y_bottom,
+                                    ox + width, y_top, ox, y_top    ]
+            k += 8
+
+        # all the vertical lines in the grid
+        for i in range(cols + 1):
+            x_left = ox + i * horizontal_space - half
+            x_right = x_left + thickness
+            coords[k : k + 8] = [   x_left, oy, x_right, oy,
+                                    x_right, oy + height, x_left, oy + height   ]
+            k += 8
+
+        # triangulate every rectangle the same way generateRectangle() does
+        indices = [ 0 ] * (6 * num_lines)
+        for n in range(num_lines):
+            b = 4 * n
+            indices[6 * n : 6 * n + 6] = [ b, b + 1, b + 2, b + 2, b + 3, b ]
+
+        coords = np.asarray(coords, dtype=np.float32)
+        colors = np.frombuffer(bytes(color) * (4 * num_lines), dtype=np.uint8)
+        indices = np.asarray(indices, dtype=np.int32)
+
+        np.savez(cache_file, coords=coords, colors=colors, indices=indices)
+
+    # thin grids have no index array; everything else tells the two cases apart
+    if len(indices) == 0:
+        grid.add(   2 * num_lines, pyglet.gl.GL_LINES, group,
+                    ('v2f/static', coords),
+                    ('c3B/static', colors) )
+    else:
+        grid.add_indexed(   4 * num_lines, pyglet.gl.GL_TRIANGLES, group, indices,
+                            ('v2f/static', coords),
+                            ('c3B/static', colors) )
 
     return grid
 
 # create the main window (16:9 aspect ratio)
 window = pyglet.window.Window(WINDOW_WIDTH, WINDOW_HEIGHT)
 
+# one batch shared by everything drawn in this test, with ordered groups
+# keeping the draw order grid -> labels -> user; a single batch.draw() then
+# renders the whole scene instead of three separate draw calls (each of which
+# re-binds GL state)
+MAIN_BATCH = pyglet.graphics.Batch()
+GRID_GROUP = pyglet.graphics.OrderedGroup(0)
+LABEL_GROUP = pyglet.graphics.OrderedGroup(1)
+USER_ORDER = 2      # draw order of the user's TranslationGroup
+
 # create the grid
 grid = Grid(    [ 0.05 * WINDOW_WIDTH, 0.05 * WINDOW_HEIGHT ],
                 0.45 * WINDOW_WIDTH,
@@ -214,20 +389,28 @@ grid = Grid(    [ 0.05 * WINDOW_WIDTH, 0.05 * WINDOW_HEIGHT ],
                 color = (188, 188, 188),
                 thickness = 3.5,
                 label = True,
-                alpha = True    )
+                alpha = True,
+                batch = MAIN_BATCH,
+                group = GRID_GROUP,
+                labelGroup = LABEL_GROUP    )
 
-# choose a random cell to start the user in
-start_row = floor(random() * GRID_ROWS)
-start_col = floor(random() * GRID_COLS)
+# choose a random cell to start the user in (randrange() draws the integer
+# directly instead of scaling a float and flooring it)
+start_row = randrange(GRID_ROWS)
+start_col = randrange(GRID_COLS)
 
-# choose a random color for the user's circle
-user_color = [ floor(random() * 255), floor(random() * 255), floor(random() * 255) ]
+# choose a random color for the user's circle; randbytes() draws all three
+# channels with one C-level call and already comes back as a packed uint8
+# buffer, replacing three separate random()/floor() rounds
+user_color = randbytes(3)
 
 # create the user
 user = User(    grid,
                 start_row,
                 start_col,
-                color = user_color  )
+                color = user_color,
+                batch = MAIN_BATCH,
+                order = USER_ORDER  )
 
 # TODO: add labels for the grid and window positions of the user
 #cellLabel = pyglet.text.Label(  grid.getCellLabel(user.row, user.col),
@@ -264,13 +447,21 @@ def on_key_press(symbol, modifiers):
     # update the positioning labels
     #cellLabel.text = grid.getCellLabel(user.row, user.col)
 
-# draw the grid and user when the window refreshes
+    # the scene changed, so ask the event loop for a redraw
+    window.invalid = True
+
+# draw the whole scene (grid, labels, and user) in one batched call when the
+# window refreshes; nothing on screen changes between key presses, so the
+# window is marked valid after each draw and only invalidated again by
+# on_key_press -- the event loop then skips the frames in between entirely,
+# instead of re-issuing the (static) grid geometry every frame
 @window.event
 def on_draw():
     window.clear()
-    grid.draw()
-    user.draw()
+    MAIN_BATCH.draw()
     #cellLabel.draw()
     #posLabel.draw()
 
+    window.invalid = False
+
 pyglet.app.run()
@@ -1,8 +1,116 @@
 import pyglet
-from math import radians, sin, cos, sqrt
+import numpy as np
+from math import hypot
 
 # PURPOSE: selection of functions developed in previous tests for use in test6
 
+# caches for per-vertex color sequences and circle triangle index lists; the
+# same (color, vertex count) combinations come up again and again, so each
+# repeated buffer only ever gets built once
+color_cache = {}
+circle_order_cache = {}
+
+# cache of unit-circle vertex tables, keyed by the number of vertices; every
+# circle with the same vertex count shares one table, scaled and translated
+# into place, so the trig only ever runs once per vertex count
+unit_circle_cache = {}
+
+# getUnitCircle: get the interleaved [x1, y1, x2, y2, ...] vertices of a unit
+# circle drawn with 'num_points' vertices (the first vertex -- the top of the
+# circle -- is repeated at the end so the circle closes); each angle is
+# computed directly, so there's no per-vertex drift like the old rotation
+# recurrence had
+#
+# @param num_points :   number of vertices used to draw the circle
+#
+def getUnitCircle(num_points):
+    unit = unit_circle_cache.get(num_points)
+
+    if unit is None:
+        theta = np.linspace(0.0, 2.0 * np.pi, num_points + 1)
+        unit = np.empty(2 * (num_points + 1), dtype=np.float32)
+        unit[0::2] = np.sin(theta)
+        unit[1::2] = np.cos(theta)
+
+        unit_circle_cache[num_points] = unit
+
+    return unit
+
+# getColorBuffer: get the flat color sequence used to color 'n' vertices
+#
+# the sequence is built as bytes rather than a tuple of Python ints: repeating
+# a bytes object is a single C-level copy, the result is a packed uint8 buffer
+# ready for 'c3B', and it hashes cheaply as a cache key
+#
+# @param color  :   3-tuple of the RGB value to repeat
+# @param n      :   number of vertices to color
+#
+def getColorBuffer(color, n):
+    color = bytes(color)
+    key = (color, n)
+    colors = color_cache.get(key)
+
+    if colors is None:
+        colors = color * n
+        color_cache[key] = colors
+
+    return colors
+
+# getCircleOrder: get the triangle index list used to draw a filled circle of
+# 'num_points' vertices (see generateCircle below for the layout)
+#
+# @param num_points :   number of vertices used to draw the circle
+#
+def getCircleOrder(num_points):
+    order = circle_order_cache.get(num_points)
+
+    if order is None:
+        order = np.empty(3 * num_points, dtype=np.int32)
+        order[0::3] = 0
+        order[1::3] = np.arange(1, num_points + 1)
+        order[2::3] = np.arange(2, num_points + 2)
+        order = order.tolist()
+
+        circle_order_cache[num_points] = order
+
+    return order
+
+# makeVertexList: create the vertex list for a finished shape, either on its
+# own or inside a batch; every generator below funnels its buffers through
+# here, so the vertex_list-vs-batch.add fork (which used to be copied into
+# each generator) lives in exactly one place
+#
+# @param count      :   number of vertices in the shape
+# @param mode       :   OpenGL mode the shape draws in (standalone vertex
+#                       lists instead take the mode as an argument to their
+#                       draw() method)
+# @param order      :   index list for indexed shapes, or None
+# @param vertices   :   flat 'v2f' vertex data for the shape
+# @param colors     :   flat 'c3B' color data for the shape
+# @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
+#
+def makeVertexList(count, mode, order, vertices, colors, batch=None, group=None):
+    if batch is None:
+        if order is None:
+            return  pyglet.graphics.vertex_list(count,
+                    ('v2f', vertices),
+                    ('c3B', colors))
+        else:
+            return  pyglet.graphics.vertex_list_indexed(count, order,
+                    ('v2f', vertices),
+                    ('c3B', colors))
+    else:
+        if order is None:
+            return  batch.add(count, mode, group,
+                    ('v2f', vertices),
+                    ('c3B', colors))
+        else:
+            return  batch.add_indexed(count, mode, group, order,
+                    ('v2f', vertices),
+                    ('c3B', colors))
+
 # generateCircle: generate the vertex list needed to draw and color a circle
 #
 # @param center     :   tuple of x- and y-coordinates for the center of the circle
@@ -15,86 +123,45 @@ from math import radians, sin, cos, sqrt
 # @param fill       :   boolean representing if the circle should be filled
 #                       in or not (optional)
 # @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
 #
-def generateCircle(center, radius, num_points, color=(255, 255, 255), fill=False, batch=None):
-    # initialize the list of vertex coordinates with the top of the circle
-    vertices = [ center[0], center[1] + radius ]
-
-    # set the angle to rotate vertices on the circle by (vertices are evenly spaced)
-    angle = radians(360.0 / num_points)
-
-    # instead of calculating the sine and cosines needed to find all vertices on
-    # the circle (x = r * cos(angle) and y = r * sin(angle)), we can just
-    # calculate the sine and cosine for the set angle and then multiply
-    # the starting vertex by the Cartesian rotation matrix. Each matrix
-    # multiplication will rotate us along the circle by 'angle' radians, so
-    # can just mutliply the current vertex we're on by the matrix
-    # 'num_points' times to draw the circle
-    #
-    # the relevant matrix is:   [   cos(angle), -sin(angle)   ]
-    #                           [   sin(angle), cos(angle)    ]
-
-    # doing this only once is way faster than doing it 'num_points' times
-    cosine = cos(angle)
-    sine = sin(angle)
-
-    # we need to start the vertex generating process about the origin to perform
-    # the rotation properly (rotation/translation is not communitative)
-    currentVertex = [ 0, radius ]
-
-    # calculate the vertices used to draw the circle (the first vertex is
-    # repeated at the end to close the circle)
-    for i in range(num_points):
-        # get the x and y coordinates of the next vertex (which will be the
-        # current vertex rotated 'angle' radians around the circle,
-        # counter-clockwise)
-        nextVertex = [  currentVertex[0] * cosine - currentVertex[1] * sine,
-                        currentVertex[0] * sine + currentVertex[1] * cosine ]
-
-        # translate the calculated coordinates so that the circle is
-        # centered about ('center_x', 'center_y')
-        vertices += [ nextVertex[0] + center[0], nextVertex[1] + center[1] ]
-
-        # update the current vertex coordinates
-        currentVertex = nextVertex
+def generateCircle(center, radius, num_points, color=(255, 255, 255), fill=False, batch=None, group=None):
+    # scale and translate the cached unit-circle table into place; the trig
+    # for this vertex count already happened (at most once, in
+    # getUnitCircle()), so building this circle is just a vectorized
+    # multiply-add over a contiguous float32 buffer that pyglet can copy into
+    # its vertex buffer in one block
+    vertices = radius * getUnitCircle(num_points)
+    vertices[0::2] += center[0]
+    vertices[1::2] += center[1]
 
     # triangulate the circle to fully color it (use GL_TRIANGLES mode)
     if fill is True:
         # we will add the center of the circle to the list of vertices (as vertex 0); each
         # triangle will be made up of two adjacent vertices on the circle and the center vertex
-        order = []
-        for i in range(1, num_points + 1):
-            order += [ 0, i, i+1 ]
-
-        # if a batch is not specified, return the vertex list for the circle (needs to be drawn
-        # in GL_TRIANGLES mode)
-        if batch is None:
-            # we have 'num_points' + 2 vertices in total in the list: the center, the
-            # 'num_points' vertices around the circle, and the first vertex (at the top
-            # of the circle) repeated (so the circle closes)
-            return  pyglet.graphics.vertex_list_indexed(num_points + 2, order,
-                    ('v2f', center + vertices),
-                    ('c3B', color * (num_points + 2)))
-
-        # if a batch is specified, add the circle to the batch and return its vertex list
-        else:
-            return  batch.add_indexed(num_points + 2, pyglet.gl.GL_TRIANGLES, None, order,
-                    ('v2f', center + vertices),
-                    ('c3B', color * (num_points + 2)))
+        order = getCircleOrder(num_points)
+
+        # prepend the center vertex to the ring, again as one float32 buffer
+        filled = np.empty(2 * (num_points + 2), dtype=np.float32)
+        filled[0] = center[0]
+        filled[1] = center[1]
+        filled[2:] = vertices
+
+        # we have 'num_points' + 2 vertices in total in the list: the center, the
+        # 'num_points' vertices around the circle, and the first vertex (at the top
+        # of the circle) repeated (so the circle closes)
+        return makeVertexList(  num_points + 2, pyglet.gl.GL_TRIANGLES, order,
+                                filled, getColorBuffer(color, num_points + 2),
+                                batch=batch, group=group    )
 
     # if we're not filling in the circle, we can use GL_LINE_STRIP mode to draw the outline
     else:
-        if batch is None:
-            # we have 'num_points' + 1 total vertices; the last vertex is the first vertex
-            # repeated so that the circle closes
-            return  pyglet.graphics.vertex_list(num_points + 1,
-                    ('v2f', vertices),
-                    ('c3B', color * (num_points + 1)))
-
-        else:
-            return  batch.add(num_points + 1, pyglet.gl.GL_LINE_STRIP, None,
-                    ('v2f', vertices),
-                    ('c3B', color * (num_points + 1)))
+        # we have 'num_points' + 1 total vertices; the last vertex is the first vertex
+        # repeated so that the circle closes
+        return makeVertexList(  num_points + 1, pyglet.gl.GL_LINE_STRIP, None,
+                                vertices, getColorBuffer(color, num_points + 1),
+                                batch=batch, group=group    )
 
 # generateRectangle: generate the vertex list needed to draw a rectangle
 #
@@ -106,8 +173,10 @@ def generateCircle(center, radius, num_points, color=(255, 255, 255), fill=False
 # @param fill       :   boolean representing if the rectangle should be filled
 #                       in or not (optional)
 # @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
 #
-def generateRectangle(origin, width, height, color=(255, 255, 255), fill=False, batch=None):
+def generateRectangle(origin, width, height, color=(255, 255, 255), fill=False, batch=None, group=None):
     # calculate the corner vertices' coordinates for the rectangle (in counter-clockwise
     # order, starting with the bottom left corner)
     vertices = [    origin[0], origin[1],
@@ -117,33 +186,70 @@ def generateRectangle(origin, width, height, color=(255, 255, 255), fill=False,
 
     # triangulate the rectangle to color it with GL_TRIANGLES mode
     if fill is True:
-        # if no batch is specified, just return the vertex list used to make the rectangle (should
-        # be drawn in GL_TRIANGLES mode)
-        if batch is None:
-            return  pyglet.graphics.vertex_list_indexed(4,
-                    [ 0, 1, 2, 2, 3, 0 ],
-                    ('v2f', vertices),
-                    ('c3B', color * 4))
-
-        # otherwise, add the vertex list to the given batch and return it
-        else:
-            return  batch.add_indexed(4, pyglet.gl.GL_TRIANGLES, None,
-                    [ 0, 1, 2, 2, 3, 0 ],
-                    ('v2f', vertices),
-                    ('c3B', color * 4))
+        return makeVertexList(  4, pyglet.gl.GL_TRIANGLES, [ 0, 1, 2, 2, 3, 0 ],
+                                vertices, getColorBuffer(color, 4),
+                                batch=batch, group=group    )
 
     # otherwise, if we're not filling in the rectangle, use GL_LINE_STRIP mode
+    # (the bottom left corner is added as a 5th vertex to close the rectangle)
     else:
-        if batch is None:
-            # add the bottom left corner as a 5th vertex to close the rectangle
-            return  pyglet.graphics.vertex_list(5,
-                    ('v2f', vertices + origin),
-                    ('c3B', color * 5))
+        return makeVertexList(  5, pyglet.gl.GL_LINE_STRIP, None,
+                                vertices + list(origin), getColorBuffer(color, 5),
+                                batch=batch, group=group    )
 
-        else:
-            return  batch.add(5, pyglet.gl.GL_LINE_STRIP, None,
-                    ('v2f', vertices + origin),
-                    ('c3B', color * 5))
+# generateThinLine: generate the vertex list for a 1-pixel-wide line; call
+# this directly when the caller already knows the line is thin, skipping
+# generateLine()'s thickness and orientation checks
+#
+# @param x1         :   x-coordinate of first vertex
+# @param y1         :   y-coordinate of first vertex
+# @param x2         :   x-coordinate of second vertex
+# @param y2         :   y-coordinate of second vertex
+# @param color      :   3-tuple of the RGB value to color the line with
+#                       (optional)
+# @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
+#
+def generateThinLine(x1, y1, x2, y2, color=(255, 255, 255), batch=None, group=None):
+    return makeVertexList(  2, pyglet.gl.GL_LINES, None,
+                            (x1, y1, x2, y2), getColorBuffer(color, 2),
+                            batch=batch, group=group    )
+
+# generateThickHLine: generate the vertex list for a thick horizontal line
+# starting at (x, y) and running 'length' pixels to the right; a thick
+# horizontal line is just an axis-aligned filled rectangle, so there's no
+# orientation math to do at all
+#
+# @param x          :   x-coordinate of the line's left endpoint
+# @param y          :   y-coordinate of the line's left endpoint
+# @param length     :   length of the line in pixels
+# @param width      :   width (thickness) of the line in pixels
+# @param color      :   3-tuple of the RGB value to color the line with
+#                       (optional)
+# @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
+#
+def generateThickHLine(x, y, length, width, color=(255, 255, 255), batch=None, group=None):
+    return generateRectangle([ x, y - 0.5 * width ], length, width, color=color, fill=True, batch=batch, group=group)
+
+# generateThickVLine: generate the vertex list for a thick vertical line
+# starting at (x, y) and running 'length' pixels upwards (see
+# generateThickHLine above)
+#
+# @param x          :   x-coordinate of the line's bottom endpoint
+# @param y          :   y-coordinate of the line's bottom endpoint
+# @param length     :   length of the line in pixels
+# @param width      :   width (thickness) of the line in pixels
+# @param color      :   3-tuple of the RGB value to color the line with
+#                       (optional)
+# @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
+#
+def generateThickVLine(x, y, length, width, color=(255, 255, 255), batch=None, group=None):
+    return generateRectangle([ x - 0.5 * width, y ], width, length, color=color, fill=True, batch=batch, group=group)
 
 # generateLine: generate vertex list needed to draw a line of arbitrary thickness
 #
@@ -155,101 +261,69 @@ def generateRectangle(origin, width, height, color=(255, 255, 255), fill=False,
 #                       the shortest perpendicular distance) in the generated
 #                       rectangle (optional)
 # @param batch      :   batch to add vertex list to (optional)
+# @param group      :   pyglet group to draw the vertex list in, when a batch
+#                       is given (optional)
 #
-def generateLine(p1, p2, color=(255, 255, 255), width=1.0, batch=None):
+def generateLine(p1, p2, color=(255, 255, 255), width=1.0, batch=None, group=None):
     # lines of thickness <= 1.0 are just treated as regular GL_LINES of width 1.0 pixels
     if width <= 1.0:
-        # if no batch is specified, just return the vertex list for the line (needs to be
-        # drawn in GL_LINES mode)
-        if batch is None:
-            return pyglet.graphics.vertex_list(2,
-                    ('v2f', (p1[0], p1[1], p2[0], p2[1])),
-                    ('c3B', color * 2))
-
-        # if a batch is specified, add the line to the batch and return its vertex list
-        else:
-            return batch.add    (2, pyglet.gl.GL_LINES, None,
-                                ('v2f', (p1[0], p1[1], p2[0], p2[1])),
-                                ('c3B', color * 2))
+        return generateThinLine(p1[0], p1[1], p2[0], p2[1], color=color, batch=batch, group=group)
 
     # lines of thickness > 1.0 need to be triangulated, since GL_TRIANGLES are filled with color
     else:
         # a thick line is basically a rectangle (arbitrarily rotated), so we just find the four
         # corners of the rectangle and triangulate it
 
-        # deal with horizontal and vertical lines by just using generateRectangle()
+        # hand horizontal and vertical lines off to their specialized functions
+        # (callers that already know the orientation can call these directly
+        # and skip this dispatching entirely)
         if p2[0] == p1[0]:  # vertical line
-            # calculate the coordinates for the bottom left corner of the rectangle
             if p1[1] <= p2[1]:
-                origin = [ p1[0] - 0.5 * width, p1[1] ]
+                return generateThickVLine(p1[0], p1[1], p2[1] - p1[1], width, color=color, batch=batch, group=group)
             else:
-                origin = [ p2[0] - 0.5 * width, p2[1] ]
-
-            return generateRectangle(origin, width, abs(p2[1] - p1[1]), color=color, fill=True, batch=batch)
+                return generateThickVLine(p2[0], p2[1], p1[1] - p2[1], width, color=color, batch=batch, group=group)
 
         elif p2[1] == p1[1]:    # horizontal line
             if p1[0] <= p2[0]:
-                origin = [ p1[0], p1[1] - 0.5 * width ]
+                return generateThickHLine(p1[0], p1[1], p2[0] - p1[0], width, color=color, batch=batch, group=group)
             else:
-                origin = [ p2[0], p2[1] - 0.5 * width ]
-
-            return generateRectangle(origin, abs(p2[0] - p1[0]), width, color=color, fill=True, batch=batch)
+                return generateThickHLine(p2[0], p2[1], p1[0] - p2[0], width, color=color, batch=batch, group=group)
 
         # deal with lines not parallel to the x or y axes
         else:
-            # since the angle the rectangle is rotated (counter-clockwise, about the midpoint of the line)
-            # is the arctangent of the slope of the line, multiplying the corner coordinates by the Cartesian
-            # rotation matrix involves sin( arctan(x) ) and cos( arctan(x) ) terms, which simplify into
-            # expressions only involving square roots
-            slope = float((p2[1] - p1[1]) / (p2[0] - p1[0]))
-            cosine = 1.0 / sqrt(1 + slope ** 2)
-            sine = cosine * slope
-
-            # first, we translate the line's endpoints so its midpoint would be at the origin;
-            # then the rectangle's resulting corner points (q1, q2, q3, q4 -- starting at the top
-            # left corner and going in counter-clockwise order) are multiplied by the Cartesian
-            # rotation matrix to produce the points of the rectangle that represents the thickened
-            # line; we then translate the rotated rectangle so its center point is at the
-            # true midpoint of the line
-            mid_x = 0.5 * (p1[0] + p2[0])
-            mid_y = 0.5 * (p1[1] + p2[1])
-
-            p1[0] = p1[0] - mid_x
-            p1[1] = p1[1] - mid_y
-            p2[0] = p2[0] - mid_x
-            p2[1] = p2[1] - mid_y
-
-            # note: this is a lil ugly; I should probably change the names of the corner coordinates
-            # to something other than q1_y, etc.
-            q1_x = p1[0] * cosine - (p1[1] + 0.5 * width) * sine + mid_x
-            q1_y = p1[0] * sine + (p1[1] + 0.5 * width) * cosine + mid_y
-            q2_x = p1[0] * cosine - (p1[1] - 0.5 * width) * sine + mid_x
-            q2_y = p1[0] * sine + (p1[1] - 0.5 * width) * cosine + mid_y
-            q3_x = p2[0] * cosine - (p2[1] - 0.5 * width) * sine + mid_x
-            q3_y = p2[0] * sine + (p2[1] - 0.5 * width) * cosine + mid_y
-            q4_x = p2[0] * cosine - (p2[1] + 0.5 * width) * sine + mid_x
-            q4_y = p2[0] * sine + (p2[1] + 0.5 * width) * cosine + mid_y
-
-            # if a batch is not specified, return the vertex list for the rectangle (needs to be drawn
-            # in GL_TRIANGLES mode)
-            if batch is None:
-                # use the rectangle 's4 vertices to form the two adjacent triangles; the indices
-                # show which vertices we use the make the triangle (the first triangle is made of
-                # q1/q2/q4, etc.)
-                return  pyglet.graphics.vertex_list_indexed(4,
-                        [0, 1, 3, 2, 1, 3],
-                        ('v2f', (   q1_x, q1_y,
-                                    q2_x, q2_y,
-                                    q3_x, q3_y,
-                                    q4_x, q4_y  )),
-                        ('c3B', color * 4))
-
-            # if a batch is specified, add the rectangle to the batch and return its vertex list
-            else:
-                return batch.add_indexed(4, pyglet.gl.GL_TRIANGLES, None,
-                                        [0, 1, 3, 2, 1, 3],
-                                        ('v2f', (   q1_x, q1_y,
-                                                    q2_x, q2_y,
-                                                    q3_x, q3_y,
-                                                    q4_x, q4_y) ),
-                                        ('c3B', color * 4))
+            # the rectangle's corners are just the line's endpoints pushed half
+            # the width along the line's unit normal, so there's no need for
+            # the old translate-to-origin / rotate / translate-back dance;
+            # hypot() also gives a numerically stable line length, with no
+            # slope division that blows up for near-vertical lines, and the
+            # caller's endpoints are never written to (mutating them corrupted
+            # any point lists reused across calls)
+            delta_x = p2[0] - p1[0]
+            delta_y = p2[1] - p1[1]
+            length = hypot(delta_x, delta_y)
+
+            # half-width offset along the line's unit normal
+            offset_x = -delta_y / length * 0.5 * width
+            offset_y = delta_x / length * 0.5 * width
+
+            # the corner points (q1, q2, q3, q4 -- starting at the top left
+            # corner and going in counter-clockwise order)
+            q1_x = p1[0] + offset_x
+            q1_y = p1[1] + offset_y
+            q2_x = p1[0] - offset_x
+            q2_y = p1[1] - offset_y
+            q3_x = p2[0] - offset_x
+            q3_y = p2[1] - offset_y
+            q4_x = p2[0] + offset_x
+            q4_y = p2[1] + offset_y
+
+            # use the rectangle's 4 vertices to form the two adjacent triangles; the indices
+            # show which vertices we use the make the triangle (the first triangle is made of
+            # q1/q2/q4, etc.)
+            return makeVertexList(  4, pyglet.gl.GL_TRIANGLES, [0, 1, 3, 2, 1, 3],
+                                    (   q1_x, q1_y,
+                                        q2_x, q2_y,
+                                        q3_x, q3_y,
+                                        q4_x, q4_y  ),
+                                    getColorBuffer(color, 4),
+                                    batch=batch, group=group    )